@@ -1,4 +1,6 @@
 import os
+from typing import Any, Optional
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -7,6 +9,18 @@ class Settings(BaseSettings):
 
     MONGODB_URL: str = os.getenv('MONGODB_URL')
     MONGODB_DATABASE_NAME: str = os.getenv('MONGODB_DATABASE_NAME')
+    # Opcional: dias até os payloads `result` dos logs expirarem. Sem valor, nada expira.
+    LOG_RESULT_RETENTION_DAYS: Optional[int] = os.getenv('LOG_RESULT_RETENTION_DAYS') or None
+
+    @field_validator("LOG_RESULT_RETENTION_DAYS", mode="before")
+    @classmethod
+    def validate_log_result_retention_days(cls, value: Any) -> Optional[int]:
+        if value is None or value == "":
+            return None
+        value = int(value)
+        if value <= 0:
+            raise ValueError("LOG_RESULT_RETENTION_DAYS deve ser maior que zero (ou ausente para desativar a expiração).")
+        return value
 
     class Config:
         env_file = ".env"
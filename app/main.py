@@ -1,9 +1,11 @@
 # app/main.py
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Body
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Body, Query
+from contextlib import asynccontextmanager
 from typing import List, Optional, Union, Dict, Any
 from uuid import uuid4, UUID
 import datetime
+import time
 
 from .models.schemas import (
     ResumeSummary,
@@ -11,18 +13,27 @@ from .models.schemas import (
     SummaryResponse,
     QueryResponse,
     LogEntry,
-    ProcessingErrorDetail
+    ProcessingErrorDetail,
+    UsageAnalyticsEntry,
+    UsageAnalyticsResponse
 )
 
 from .services import (
     extract_text_from_file,
     generate_summary,
     find_best_match,
-    log_request
+    log_request,
+    ensure_indexes,
+    get_usage_analytics
 )
 
 from .core.config import settings
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ensure_indexes()
+    yield
+
 app = FastAPI(
     title="Serviço Inteligente de Triagem de Currículos de Fabio",
     version="1.0.0",
@@ -30,6 +41,7 @@ app = FastAPI(
     API para extrair texto de currículos (PDF/imagem), gerar sumários
     e encontrar o melhor candidato para uma vaga específica.
     """,
+    lifespan=lifespan,
 )
 
 # --- Endpoints da API ---
@@ -77,6 +89,7 @@ async def process_resumes_endpoint(
     query: Optional[str] = Form(None, example="Engenheiro de Software Pleno, Python, FastAPI, AWS", description="Descrição da vaga e requisitos (opcional). Se não informado, retorna sumários."),
     files: List[UploadFile] = File(..., description="Lista de arquivos de currículo (PDF, JPG, PNG).")
 ):
+    started_at = time.perf_counter()
     if not files:
         raise HTTPException(status_code=400, detail="Nenhum arquivo enviado.")
 
@@ -111,7 +124,10 @@ async def process_resumes_endpoint(
             user_id=user_id,
             query=query,
             result={"message": "Falha ao processar todos os arquivos.", "errors": processing_errors},
-            error=f"Falha no processamento de todos os arquivos: {error_detail_str}"
+            error=f"Falha no processamento de todos os arquivos: {error_detail_str}",
+            latency_ms=(time.perf_counter() - started_at) * 1000,
+            files_processed=0,
+            files_failed=len(processing_errors)
         )
         raise HTTPException(status_code=500, detail=f"Não foi possível processar nenhum dos arquivos. Erros: {processing_errors}")
 
@@ -193,7 +209,41 @@ async def process_resumes_endpoint(
         user_id=user_id,
         query=query,
         result=log_result_data_for_db,
-        error=None
+        error=None,
+        latency_ms=(time.perf_counter() - started_at) * 1000,
+        files_processed=len(valid_texts_for_llm),
+        files_failed=len(processing_errors)
     )
 
-    return response_payload
\ No newline at end of file
+    return response_payload
+
+@app.get(
+    "/analytics/usage",
+    response_model=UsageAnalyticsResponse,
+    summary="Métricas de uso por usuário e dia",
+    tags=["Analytics"],
+    responses={
+        400: {"description": "Intervalo de datas inválido"},
+    }
+)
+def usage_analytics_endpoint(
+    start: Optional[datetime.datetime] = Query(None, description="Início do intervalo (UTC, arredondado para baixo até a hora cheia). Padrão: 7 dias antes de `end`."),
+    end: Optional[datetime.datetime] = Query(None, description="Fim do intervalo (UTC, exclusivo, arredondado para cima até a hora cheia). Padrão: agora."),
+    user_id: Optional[str] = Query(None, description="Filtra as métricas para um único usuário.")
+):
+    # Os timestamps são gravados em UTC sem fuso; normaliza datas com fuso para o mesmo formato.
+    if start and start.tzinfo:
+        start = start.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    if end and end.tzinfo:
+        end = end.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    end = end or datetime.datetime.utcnow()
+    start = start or end - datetime.timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="O início do intervalo deve ser anterior ao fim.")
+
+    analytics = get_usage_analytics(start=start, end=end, user_id=user_id)
+    return UsageAnalyticsResponse(
+        start=analytics["start"],
+        end=analytics["end"],
+        entries=[UsageAnalyticsEntry(**entry) for entry in analytics["entries"]]
+    )
\ No newline at end of file
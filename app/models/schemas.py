@@ -32,4 +32,24 @@ class LogEntry(BaseModel):
     timestamp: datetime.datetime
     query: Optional[str] = None
     result: Dict[str, Any]
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
+    latency_ms: Optional[float] = None
+    files_processed: Optional[int] = None
+    files_failed: Optional[int] = None
+
+class UsageAnalyticsEntry(BaseModel):
+    user_id: str
+    date: datetime.date
+    requests: int
+    errors: int
+    files_processed: int
+    files_failed: int = 0
+    latency_avg_ms: Optional[float] = None
+    latency_p50_ms: Optional[float] = None
+    latency_p95_ms: Optional[float] = None
+    latency_p99_ms: Optional[float] = None
+
+class UsageAnalyticsResponse(BaseModel):
+    start: datetime.datetime
+    end: datetime.datetime
+    entries: List[UsageAnalyticsEntry]
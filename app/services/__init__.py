@@ -1,11 +1,13 @@
 # resume-screener/app/services/__init__.py
 from .ocr_service import extract_text_from_file
 from .llm_service import generate_summary, find_best_match
-from .db_service import log_request
+from .db_service import log_request, ensure_indexes, get_usage_analytics
 
 __all__ = [
     "extract_text_from_file",
     "generate_summary",
     "find_best_match",
     "log_request",
+    "ensure_indexes",
+    "get_usage_analytics",
 ]
\ No newline at end of file
@@ -1,23 +1,200 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING
 from app.core.config import settings # Supondo que você tenha um settings.MONGODB_URL
 from app.models.schemas import LogEntry
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import datetime
 
 client = MongoClient(settings.MONGODB_URL)
 db = client[settings.MONGODB_DATABASE_NAME]
 logs_collection = db["usage_logs"]
+# Os payloads `result` (sumários e saída do LLM) ficam fora de usage_logs, para que os logs
+# continuem pequenos e para que só eles possam expirar.
+results_collection = db["usage_log_results"]
+rollups_collection = db["usage_rollups_hourly"]
 
-def log_request(request_id: str, user_id: str, query: Optional[str], result: dict, error: Optional[str] = None):
+# Limites superiores (ms) dos buckets do histograma de latência mantido nos rollups.
+# Os percentis são estimados a partir destes buckets, sem varrer os logs brutos.
+LATENCY_BUCKETS_MS = [100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000]
+LATENCY_OVERFLOW_BUCKET = "inf"
+
+def _create_index(collection, keys, **kwargs):
+    # Cada índice é criado isoladamente: um conflito em um não impede a criação dos demais.
+    try:
+        collection.create_index(keys, **kwargs)
+    except Exception as e:
+        print(f"Erro ao criar índice {kwargs.get('name')} em {collection.name}: {e}")
+
+def _ensure_result_ttl_index():
+    """Aplica (ou remove) a expiração opcional dos payloads `result` conforme LOG_RESULT_RETENTION_DAYS."""
+    try:
+        existing_ttl_index = results_collection.index_information().get("timestamp_ttl")
+        if settings.LOG_RESULT_RETENTION_DAYS is None:
+            if existing_ttl_index is not None:
+                results_collection.drop_index("timestamp_ttl")
+                print("Expiração dos payloads de usage_log_results desativada.")
+            return
+
+        expire_after_seconds = settings.LOG_RESULT_RETENTION_DAYS * 24 * 60 * 60
+        if existing_ttl_index is None:
+            results_collection.create_index(
+                [("timestamp", ASCENDING)],
+                name="timestamp_ttl",
+                expireAfterSeconds=expire_after_seconds
+            )
+        elif existing_ttl_index.get("expireAfterSeconds") != expire_after_seconds:
+            # create_index não altera opções de um índice existente; collMod aplica a nova retenção.
+            db.command("collMod", results_collection.name, index={"name": "timestamp_ttl", "expireAfterSeconds": expire_after_seconds})
+            print(f"Retenção dos payloads de usage_log_results atualizada para {settings.LOG_RESULT_RETENTION_DAYS} dias.")
+    except Exception as e:
+        print(f"Erro ao configurar a expiração de usage_log_results: {e}")
+
+def _drop_legacy_logs_ttl_index():
+    # Versões anteriores expiravam o documento de log inteiro; os logs agora são mantidos.
+    try:
+        if "timestamp_ttl" in logs_collection.index_information():
+            logs_collection.drop_index("timestamp_ttl")
+            print("Índice TTL legado de usage_logs removido.")
+    except Exception as e:
+        print(f"Erro ao remover índice TTL legado de usage_logs: {e}")
+
+def ensure_indexes():
+    """Cria os índices de usage_logs, usage_log_results e dos rollups horários (idempotente)."""
+    _create_index(logs_collection, [("user_id", ASCENDING), ("timestamp", DESCENDING)], name="user_id_timestamp")
+    _drop_legacy_logs_ttl_index()
+    _create_index(results_collection, [("request_id", ASCENDING)], name="request_id")
+    _ensure_result_ttl_index()
+    _create_index(rollups_collection, [("user_id", ASCENDING), ("hour", ASCENDING)], name="user_id_hour", unique=True)
+    _create_index(rollups_collection, [("hour", ASCENDING)], name="hour")
+
+def _latency_bucket(latency_ms: float) -> str:
+    for upper_bound in LATENCY_BUCKETS_MS:
+        if latency_ms <= upper_bound:
+            return str(upper_bound)
+    return LATENCY_OVERFLOW_BUCKET
+
+def _update_hourly_rollup(user_id: str, timestamp: datetime.datetime, error: Optional[str], latency_ms: Optional[float],
+                          files_processed: Optional[int], files_failed: Optional[int]):
+    hour = timestamp.replace(minute=0, second=0, microsecond=0)
+    increments: Dict[str, Any] = {
+        "requests": 1,
+        # Uma requisição conta como erro se falhou por completo ou se algum arquivo falhou
+        "errors": 1 if error or files_failed else 0,
+        "files_processed": files_processed or 0,
+        "files_failed": files_failed or 0,
+    }
+    update: Dict[str, Any] = {"$inc": increments}
+    if latency_ms is not None:
+        increments["latency_count"] = 1
+        increments["latency_sum_ms"] = latency_ms
+        increments[f"latency_hist.{_latency_bucket(latency_ms)}"] = 1
+        update["$max"] = {"latency_max_ms": latency_ms}
+
+    rollups_collection.update_one({"user_id": user_id, "hour": hour}, update, upsert=True)
+
+def log_request(request_id: str, user_id: str, query: Optional[str], result: dict, error: Optional[str] = None,
+                latency_ms: Optional[float] = None, files_processed: Optional[int] = None, files_failed: Optional[int] = None):
     log_entry = LogEntry(
         request_id=request_id,
         user_id=user_id,
         timestamp=datetime.datetime.utcnow(),
         query=query,
         result=result,
-        error=error
+        error=error,
+        latency_ms=latency_ms,
+        files_processed=files_processed,
+        files_failed=files_failed
     )
     try:
-        logs_collection.insert_one(log_entry.model_dump(exclude_none=True)) # Pydantic v2+
+        logs_collection.insert_one(log_entry.model_dump(exclude_none=True, exclude={"result"})) # Pydantic v2+
+    except Exception as e:
+        print(f"Erro ao salvar log no MongoDB: {e}")
+    try:
+        results_collection.insert_one({
+            "request_id": log_entry.request_id,
+            "user_id": log_entry.user_id,
+            "timestamp": log_entry.timestamp,
+            "result": log_entry.result
+        })
+    except Exception as e:
+        print(f"Erro ao salvar resultado do log no MongoDB: {e}")
+    try:
+        _update_hourly_rollup(user_id, log_entry.timestamp, error, latency_ms, files_processed, files_failed)
     except Exception as e:
-        print(f"Erro ao salvar log no MongoDB: {e}")
\ No newline at end of file
+        print(f"Erro ao atualizar rollup de uso no MongoDB: {e}")
+
+def _latency_percentile(histogram: Dict[str, int], total: int, percentile: float, max_latency_ms: Optional[float]) -> Optional[float]:
+    """Estima o percentil por interpolação linear dentro do bucket que o contém."""
+    if total <= 0:
+        return None
+    rank = percentile * total
+    cumulative = 0
+    lower_bound = 0.0
+    buckets = [(str(bound), float(bound)) for bound in LATENCY_BUCKETS_MS] + [(LATENCY_OVERFLOW_BUCKET, float("inf"))]
+    for bucket_name, upper_bound in buckets:
+        count = histogram.get(bucket_name, 0)
+        if count and cumulative + count >= rank:
+            # O máximo observado limita o bucket (e é o único limite do bucket de overflow)
+            if max_latency_ms is not None:
+                upper_bound = max(lower_bound, min(upper_bound, max_latency_ms))
+            if upper_bound == float("inf"):
+                return lower_bound
+            return lower_bound + (upper_bound - lower_bound) * (rank - cumulative) / count
+        cumulative += count
+        lower_bound = upper_bound
+    return max_latency_ms
+
+def _snap_to_hours(start: datetime.datetime, end: datetime.datetime) -> Tuple[datetime.datetime, datetime.datetime]:
+    """Arredonda start para baixo e end para cima até a hora cheia, a granularidade dos rollups."""
+    snapped_start = start.replace(minute=0, second=0, microsecond=0)
+    snapped_end = end.replace(minute=0, second=0, microsecond=0)
+    if snapped_end < end:
+        snapped_end += datetime.timedelta(hours=1)
+    return snapped_start, snapped_end
+
+def get_usage_analytics(start: datetime.datetime, end: datetime.datetime, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Agrega os rollups horários por usuário e dia.
+
+    O intervalo é ajustado para horas cheias ([start arredondado para baixo, end arredondado
+    para cima)) e o intervalo efetivamente consultado é retornado junto com as métricas.
+    """
+    start, end = _snap_to_hours(start, end)
+    filter_query: Dict[str, Any] = {"hour": {"$gte": start, "$lt": end}}
+    if user_id:
+        filter_query["user_id"] = user_id
+
+    daily: Dict[tuple, Dict[str, Any]] = {}
+    for rollup in rollups_collection.find(filter_query, {"_id": 0}):
+        key = (rollup["user_id"], rollup["hour"].date())
+        bucket = daily.setdefault(key, {
+            "requests": 0,
+            "errors": 0,
+            "files_processed": 0,
+            "files_failed": 0,
+            "latency_count": 0,
+            "latency_sum_ms": 0.0,
+            "latency_max_ms": None,
+            "latency_hist": {},
+        })
+        for field in ("requests", "errors", "files_processed", "files_failed", "latency_count", "latency_sum_ms"):
+            bucket[field] += rollup.get(field, 0)
+        if rollup.get("latency_max_ms") is not None:
+            bucket["latency_max_ms"] = max(bucket["latency_max_ms"] or 0, rollup["latency_max_ms"])
+        for bucket_name, count in rollup.get("latency_hist", {}).items():
+            bucket["latency_hist"][bucket_name] = bucket["latency_hist"].get(bucket_name, 0) + count
+
+    entries = []
+    for (entry_user_id, day), bucket in sorted(daily.items(), key=lambda item: (item[0][1], item[0][0])):
+        latency_count = bucket["latency_count"]
+        entries.append({
+            "user_id": entry_user_id,
+            "date": day,
+            "requests": bucket["requests"],
+            "errors": bucket["errors"],
+            "files_processed": bucket["files_processed"],
+            "files_failed": bucket["files_failed"],
+            "latency_avg_ms": bucket["latency_sum_ms"] / latency_count if latency_count else None,
+            "latency_p50_ms": _latency_percentile(bucket["latency_hist"], latency_count, 0.50, bucket["latency_max_ms"]),
+            "latency_p95_ms": _latency_percentile(bucket["latency_hist"], latency_count, 0.95, bucket["latency_max_ms"]),
+            "latency_p99_ms": _latency_percentile(bucket["latency_hist"], latency_count, 0.99, bucket["latency_max_ms"]),
+        })
+    return {"start": start, "end": end, "entries": entries}
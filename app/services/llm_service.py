@@ -2,7 +2,10 @@
 
 from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM, AutoModelForCausalLM
 import torch
-from typing import Optional, List, Dict, Any
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple
 
 try:
     summarizer_model_name = "philschmid/bart-large-cnn-samsum"
@@ -44,11 +47,146 @@ except Exception as e:
     summarizer = None
     text_generator = None
 
-def generate_summary(text: str, max_length: int = 400, min_length: int = 30) -> str:
+# Sumarização map-reduce para textos maiores que a janela do modelo
+SUMMARY_CHUNK_OVERLAP = 64
+SUMMARY_CHUNK_BATCH_SIZE = 8
+SUMMARY_CHUNK_MAX_LENGTH = 200
+SUMMARY_CHUNK_CACHE_SIZE = 512
+SUMMARY_MAX_REDUCE_DEPTH = 3
+SUMMARY_ANCHOR_WINDOW = 8
+
+_chunk_summary_cache: "OrderedDict[Tuple[Tuple[int, ...], int, int], str]" = OrderedDict()
+_chunk_summary_cache_lock = threading.Lock()
+
+def _tokenize_segments(text: str) -> List[List[int]]:
+    """Tokeniza o texto linha a linha; cada linha vira um segmento com tokens independentes do resto do texto."""
+    lines = [line for line in text.splitlines(keepends=True) if line.strip()]
+    if not lines:
+        return []
+    return summarizer.tokenizer(lines, add_special_tokens=False)["input_ids"]
+
+def _content_hash(tokens: List[int]) -> int:
+    return int.from_bytes(hashlib.blake2b(repr(tokens).encode(), digest_size=8).digest(), "big")
+
+def _is_chunk_boundary(segment: List[int], target_size: int) -> bool:
+    # Corte definido pelo conteúdo do segmento (content-defined chunking): a decisão não depende
+    # da posição no texto, então uma edição só desloca os limites até o próximo corte.
+    return _content_hash(segment) < (len(segment) / target_size) * 2 ** 64
+
+def _split_long_segment(segment: List[int], piece_target: int, max_piece: int) -> List[List[int]]:
+    """Divide uma linha longa (ex.: saída do OCR, que chega numa linha só) em pedaços definidos pelo conteúdo.
+
+    Cada token é candidato a corte conforme o hash dos últimos SUMMARY_ANCHOR_WINDOW tokens, então
+    inserir ou remover tokens só altera os pedaços em volta da edição.
+    """
+    pieces = []
+    start = 0
+    for i in range(len(segment)):
+        size = i + 1 - start
+        window = segment[max(0, i + 1 - SUMMARY_ANCHOR_WINDOW):i + 1]
+        if size >= max_piece or (size >= SUMMARY_ANCHOR_WINDOW and _content_hash(window) < 2 ** 64 / piece_target):
+            pieces.append(segment[start:i + 1])
+            start = i + 1
+    if start < len(segment):
+        pieces.append(segment[start:])
+    return pieces
+
+def _split_token_chunks(segments: List[List[int]], chunk_size: int, overlap: int = SUMMARY_CHUNK_OVERLAP) -> List[List[int]]:
+    """Agrupa os segmentos em chunks de até chunk_size tokens, com cortes definidos pelo conteúdo.
+
+    Um corte só é aceito depois que o chunk atinge 2/3 do orçamento, então o tamanho esperado fica
+    perto do orçamento inteiro. Cada chunk recebe como prefixo os últimos `overlap` tokens do anterior.
+    """
+    budget = chunk_size - overlap
+    min_window = budget * 2 // 3
+    cut_target = max(budget // 4, 1)
+    piece_target = max(budget // 8, 1)
+    pieces: List[List[int]] = []
+    for segment in segments:
+        if len(segment) > 2 * piece_target:
+            pieces.extend(_split_long_segment(segment, piece_target, budget))
+        else:
+            pieces.append(segment)
+
+    windows: List[List[int]] = []
+    current: List[int] = []
+    for piece in pieces:
+        if current and len(current) + len(piece) > budget:
+            windows.append(current)
+            current = []
+        current.extend(piece)
+        if len(current) >= min_window and _is_chunk_boundary(piece, cut_target):
+            windows.append(current)
+            current = []
+    if current:
+        windows.append(current)
+
+    chunks = []
+    for i, window in enumerate(windows):
+        prefix = windows[i - 1][-overlap:] if i > 0 and overlap else []
+        chunks.append(prefix + window)
+    return chunks
+
+def _summarize_chunks(chunks: List[List[int]], max_length: int, min_length: int) -> List[str]:
+    """Sumariza os chunks em lotes com padding, reaproveitando sumários já calculados."""
+    keys = [(tuple(chunk), max_length, min_length) for chunk in chunks]
+    summaries: Dict[int, str] = {}
+    with _chunk_summary_cache_lock:
+        for i, key in enumerate(keys):
+            if key in _chunk_summary_cache:
+                _chunk_summary_cache.move_to_end(key)
+                summaries[i] = _chunk_summary_cache[key]
+
+    pending = [i for i in range(len(chunks)) if i not in summaries]
+    for batch_start in range(0, len(pending), SUMMARY_CHUNK_BATCH_SIZE):
+        batch = pending[batch_start:batch_start + SUMMARY_CHUNK_BATCH_SIZE]
+        inputs = summarizer.tokenizer.pad(
+            {"input_ids": [summarizer.tokenizer.build_inputs_with_special_tokens(chunks[i]) for i in batch]},
+            return_tensors="pt"
+        )
+        summary_ids = summarizer.model.generate(
+            inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            num_beams=4,
+            max_length=max_length + 20,
+            min_length=min_length,
+            early_stopping=True
+        )
+        decoded = summarizer.tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+        with _chunk_summary_cache_lock:
+            for i, summary_text in zip(batch, decoded):
+                summaries[i] = summary_text
+                _chunk_summary_cache[keys[i]] = summary_text
+                _chunk_summary_cache.move_to_end(keys[i])
+            while len(_chunk_summary_cache) > SUMMARY_CHUNK_CACHE_SIZE:
+                _chunk_summary_cache.popitem(last=False)
+
+    return [summaries[i] for i in range(len(chunks))]
+
+def _map_reduce_summary(segments: List[List[int]], chunk_size: int, max_length: int, min_length: int, depth: int = 0) -> str:
+    chunk_max_length = min(SUMMARY_CHUNK_MAX_LENGTH, max_length)
+    chunk_summaries = _summarize_chunks(
+        _split_token_chunks(segments, chunk_size),
+        max_length=chunk_max_length,
+        min_length=min(min_length, chunk_max_length)
+    )
+    combined_segments = _tokenize_segments("\n".join(chunk_summaries))
+    if sum(len(segment) for segment in combined_segments) > chunk_size and depth < SUMMARY_MAX_REDUCE_DEPTH:
+        return _map_reduce_summary(combined_segments, chunk_size, max_length, min_length, depth + 1)
+    combined_ids = [token_id for segment in combined_segments for token_id in segment]
+    return _summarize_chunks([combined_ids[:chunk_size]], max_length=max_length, min_length=min_length)[0]
+
+def generate_summary(text: str, max_length: int = 400, min_length: int = 30, chunked: bool = True) -> str:
     if not summarizer or not text.strip():
         return "Não foi possível gerar o sumário (modelo de sumarização não carregado ou texto vazio)."
     try:
         max_input_length = summarizer.tokenizer.model_max_length - 20
+        if chunked:
+            segments = _tokenize_segments(text)
+            if sum(len(segment) for segment in segments) > max_input_length:
+                chunk_size = max_input_length - summarizer.tokenizer.num_special_tokens_to_add()
+                return _map_reduce_summary(segments, chunk_size, max_length, min_length)
+
         inputs = summarizer.tokenizer(text, max_length=max_input_length, truncation=True, return_tensors="pt")
 
         summary_ids = summarizer.model.generate(
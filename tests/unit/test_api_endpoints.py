@@ -88,6 +88,41 @@ def test_process_resumes_no_files_error():
     # Como 'files' é obrigatório (File(...)), um erro 422 Unprocessable Entity é esperado.
     assert response.status_code == 422 # Ou 400 se sua lógica específica tratar isso
 
+
+def test_usage_analytics_success():
+    with patch('app.main.get_usage_analytics') as mock_analytics:
+        mock_analytics.return_value = {"start": "2024-05-10T00:00:00", "end": "2024-05-11T00:00:00", "entries": [{
+            "user_id": "user-sum-test",
+            "date": "2024-05-10",
+            "requests": 4,
+            "errors": 1,
+            "files_processed": 6,
+            "latency_avg_ms": 975.0,
+            "latency_p50_ms": 400.0,
+            "latency_p95_ms": 3000.0,
+            "latency_p99_ms": 3000.0
+        }]}
+
+        response = client.get("/analytics/usage", params={
+            "start": "2024-05-10T00:00:00",
+            "end": "2024-05-11T00:00:00",
+            "user_id": "user-sum-test"
+        })
+
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response["entries"][0]["requests"] == 4
+    assert json_response["entries"][0]["latency_p50_ms"] == 400.0
+    mock_analytics.assert_called_once()
+
+
+def test_usage_analytics_invalid_range():
+    response = client.get("/analytics/usage", params={
+        "start": "2024-05-11T00:00:00",
+        "end": "2024-05-10T00:00:00"
+    })
+    assert response.status_code == 400
+
 # Adicione mais testes para:
 # - Múltiplos arquivos
 # - Tipos de arquivo inválidos (verificar como seu endpoint trata isso)
@@ -1,12 +1,14 @@
 # tests/unit/test_db_service.py
 import pytest
 from unittest.mock import patch, MagicMock
-from app.services.db_service import log_request
+from app.services.db_service import log_request, get_usage_analytics, ensure_indexes
 from app.models.schemas import LogEntry
 import datetime
 
+@patch('app.services.db_service.rollups_collection')
+@patch('app.services.db_service.results_collection')
 @patch('app.services.db_service.logs_collection')
-def test_log_request_success(mock_logs_collection):
+def test_log_request_success(mock_logs_collection, mock_results_collection, mock_rollups_collection):
     request_id = "test-req-123"
     user_id = "fabio-test"
     query = "Engenheiro de Software"
@@ -21,5 +23,132 @@ def test_log_request_success(mock_logs_collection):
     assert log_document_passed["request_id"] == request_id
     assert log_document_passed["user_id"] == user_id
     assert log_document_passed["query"] == query
-    assert log_document_passed["result"] == result_data
-    assert "timestamp" in log_document_passed
\ No newline at end of file
+    assert "result" not in log_document_passed
+    assert "timestamp" in log_document_passed
+
+    # O payload volumoso vai para a coleção separada, ligado pelo request_id
+    mock_results_collection.insert_one.assert_called_once()
+    result_document_passed = mock_results_collection.insert_one.call_args[0][0]
+    assert result_document_passed["request_id"] == request_id
+    assert result_document_passed["result"] == result_data
+    assert result_document_passed["timestamp"] == log_document_passed["timestamp"]
+
+@patch('app.services.db_service.rollups_collection')
+@patch('app.services.db_service.results_collection')
+@patch('app.services.db_service.logs_collection')
+def test_log_request_updates_hourly_rollup(mock_logs_collection, mock_results_collection, mock_rollups_collection):
+    log_request("req-1", "fabio-test", None, {"summaries": []}, error="falha", latency_ms=320.0, files_processed=2)
+
+    mock_rollups_collection.update_one.assert_called_once()
+    args, kwargs = mock_rollups_collection.update_one.call_args
+    filter_query, update = args
+
+    assert filter_query["user_id"] == "fabio-test"
+    assert filter_query["hour"].minute == 0 and filter_query["hour"].second == 0
+    assert update["$inc"]["requests"] == 1
+    assert update["$inc"]["errors"] == 1
+    assert update["$inc"]["files_processed"] == 2
+    assert update["$inc"]["latency_hist.500"] == 1
+    assert update["$max"]["latency_max_ms"] == 320.0
+    assert kwargs["upsert"] is True
+
+@patch('app.services.db_service.rollups_collection')
+@patch('app.services.db_service.results_collection')
+@patch('app.services.db_service.logs_collection')
+def test_log_request_counts_partial_failures_as_errors(mock_logs_collection, mock_results_collection, mock_rollups_collection):
+    log_request("req-2", "fabio-test", None, {"summaries": []}, error=None, latency_ms=50.0, files_processed=1, files_failed=2)
+
+    update = mock_rollups_collection.update_one.call_args[0][1]
+    assert update["$inc"]["errors"] == 1
+    assert update["$inc"]["files_processed"] == 1
+    assert update["$inc"]["files_failed"] == 2
+
+@patch('app.services.db_service.rollups_collection')
+def test_get_usage_analytics_aggregates_rollups_by_day(mock_rollups_collection):
+    day = datetime.datetime(2024, 5, 10)
+    mock_rollups_collection.find.return_value = [
+        {"user_id": "fabio-test", "hour": day.replace(hour=9), "requests": 3, "errors": 1, "files_processed": 5, "files_failed": 2,
+         "latency_count": 3, "latency_sum_ms": 900.0, "latency_max_ms": 400.0, "latency_hist": {"250": 1, "500": 2}},
+        {"user_id": "fabio-test", "hour": day.replace(hour=14), "requests": 1, "errors": 0, "files_processed": 1,
+         "latency_count": 1, "latency_sum_ms": 3000.0, "latency_max_ms": 3000.0, "latency_hist": {"5000": 1}},
+    ]
+
+    analytics = get_usage_analytics(day, day + datetime.timedelta(days=1), user_id="fabio-test")
+
+    filter_query = mock_rollups_collection.find.call_args[0][0]
+    assert filter_query["user_id"] == "fabio-test"
+    entries = analytics["entries"]
+    assert len(entries) == 1
+    entry = entries[0]
+    assert entry["date"] == day.date()
+    assert entry["requests"] == 4
+    assert entry["errors"] == 1
+    assert entry["files_processed"] == 6
+    assert entry["files_failed"] == 2
+    assert entry["latency_avg_ms"] == 975.0
+    # Interpolação linear dentro do bucket; o bucket de 5000 ms é limitado pelo máximo (3000 ms)
+    assert entry["latency_p50_ms"] == 375.0
+    assert entry["latency_p95_ms"] == pytest.approx(2900.0)
+    assert entry["latency_p99_ms"] == pytest.approx(2980.0)
+
+@patch('app.services.db_service.rollups_collection')
+def test_get_usage_analytics_snaps_range_to_whole_hours(mock_rollups_collection):
+    mock_rollups_collection.find.return_value = []
+
+    analytics = get_usage_analytics(datetime.datetime(2024, 5, 10, 9, 30), datetime.datetime(2024, 5, 10, 14, 15))
+
+    filter_query = mock_rollups_collection.find.call_args[0][0]
+    assert filter_query["hour"] == {"$gte": datetime.datetime(2024, 5, 10, 9), "$lt": datetime.datetime(2024, 5, 10, 15)}
+    assert analytics["start"] == datetime.datetime(2024, 5, 10, 9)
+    assert analytics["end"] == datetime.datetime(2024, 5, 10, 15)
+
+@patch('app.services.db_service.settings')
+@patch('app.services.db_service.db')
+@patch('app.services.db_service.rollups_collection')
+@patch('app.services.db_service.results_collection')
+@patch('app.services.db_service.logs_collection')
+def test_ensure_indexes_updates_result_ttl_when_retention_changes(mock_logs_collection, mock_results_collection, mock_rollups_collection, mock_db, mock_settings):
+    mock_settings.LOG_RESULT_RETENTION_DAYS = 7
+    mock_results_collection.name = "usage_log_results"
+    mock_logs_collection.index_information.return_value = {}
+    mock_results_collection.index_information.return_value = {
+        "timestamp_ttl": {"key": [("timestamp", 1)], "expireAfterSeconds": 30 * 24 * 60 * 60}
+    }
+
+    ensure_indexes()
+
+    mock_db.command.assert_called_once_with(
+        "collMod", "usage_log_results", index={"name": "timestamp_ttl", "expireAfterSeconds": 7 * 24 * 60 * 60}
+    )
+    created_index_names = [call.kwargs.get("name") for call in mock_results_collection.create_index.call_args_list]
+    assert "timestamp_ttl" not in created_index_names
+
+@patch('app.services.db_service.settings')
+@patch('app.services.db_service.rollups_collection')
+@patch('app.services.db_service.results_collection')
+@patch('app.services.db_service.logs_collection')
+def test_ensure_indexes_keeps_logs_without_retention(mock_logs_collection, mock_results_collection, mock_rollups_collection, mock_settings):
+    mock_settings.LOG_RESULT_RETENTION_DAYS = None
+    mock_logs_collection.index_information.return_value = {"timestamp_ttl": {"expireAfterSeconds": 30 * 24 * 60 * 60}}
+    mock_results_collection.index_information.return_value = {}
+
+    ensure_indexes()
+
+    # Sem retenção configurada nenhum TTL é criado, e o TTL legado dos logs é removido
+    mock_logs_collection.drop_index.assert_called_once_with("timestamp_ttl")
+    all_create_calls = mock_logs_collection.create_index.call_args_list + mock_results_collection.create_index.call_args_list
+    assert not any("expireAfterSeconds" in call.kwargs for call in all_create_calls)
+
+@patch('app.services.db_service.settings')
+@patch('app.services.db_service.rollups_collection')
+@patch('app.services.db_service.results_collection')
+@patch('app.services.db_service.logs_collection')
+def test_ensure_indexes_conflict_does_not_skip_other_indexes(mock_logs_collection, mock_results_collection, mock_rollups_collection, mock_settings):
+    mock_settings.LOG_RESULT_RETENTION_DAYS = None
+    mock_logs_collection.create_index.side_effect = Exception("IndexOptionsConflict")
+    mock_results_collection.index_information.return_value = {}
+
+    ensure_indexes()
+
+    created_rollup_indexes = [call.kwargs.get("name") for call in mock_rollups_collection.create_index.call_args_list]
+    assert created_rollup_indexes == ["user_id_hour", "hour"]
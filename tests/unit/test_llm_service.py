@@ -1,7 +1,9 @@
 # tests/unit/test_llm_service.py
 import pytest
+import zlib
 from unittest.mock import patch, MagicMock
-from app.services.llm_service import generate_summary, find_best_match
+from app.services import llm_service
+from app.services.llm_service import generate_summary, find_best_match, _split_token_chunks
 
 @patch('app.services.llm_service.summarizer')
 def test_generate_summary_success(mock_summarizer_pipeline):
@@ -35,4 +37,98 @@ def test_find_best_match_success(mock_text_generator_pipeline):
     assert match is not None
     assert match["file_name"] == "cv1.pdf"
     assert "Candidato excelente" in match["justification"]
-    mock_text_generator_pipeline.assert_called_once()
\ No newline at end of file
+    mock_text_generator_pipeline.assert_called_once()
+
+def _fake_segments(num_lines, tokens_per_line=12, first_token=0):
+    return [list(range(first_token + i * tokens_per_line, first_token + (i + 1) * tokens_per_line)) for i in range(num_lines)]
+
+def _fake_line_tokenizer(lines, add_special_tokens=False):
+    # Um token por palavra, com id estável derivado da própria palavra
+    return {"input_ids": [[zlib.crc32(word.encode()) % 50000 for word in line.split()] for line in lines]}
+
+def test_split_token_chunks_cuts_on_segments_with_overlap():
+    segments = _fake_segments(60)
+    chunks = _split_token_chunks(segments, chunk_size=100, overlap=20)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    # Cada chunk começa com os últimos tokens do anterior e nenhuma linha é cortada no meio
+    assert all(chunks[i][0] in chunks[i - 1] for i in range(1, len(chunks)))
+    for segment in segments:
+        assert any(
+            chunk[start:start + len(segment)] == segment
+            for chunk in chunks for start in range(len(chunk))
+        )
+
+def test_split_token_chunks_edit_keeps_later_chunks():
+    segments = _fake_segments(60)
+    original_chunks = _split_token_chunks(segments, chunk_size=100, overlap=20)
+
+    edited_segments = [list(segment) for segment in segments]
+    edited_segments[1] = edited_segments[1] + [90001, 90002, 90003, 90004, 90005]
+    edited_chunks = _split_token_chunks(edited_segments, chunk_size=100, overlap=20)
+
+    changed_chunks = [chunk for chunk in edited_chunks if chunk not in original_chunks]
+    assert len(original_chunks) >= 4
+    assert len(changed_chunks) <= 2
+    assert edited_chunks[-(len(original_chunks) - 2):] == original_chunks[2:]
+
+def test_split_token_chunks_single_long_line_edit_keeps_other_chunks():
+    # Texto de OCR chega como uma única linha longa
+    line = [zlib.crc32(str(i).encode()) % 50000 for i in range(3000)]
+    original_chunks = _split_token_chunks([line], chunk_size=1002, overlap=64)
+
+    edited_chunks = _split_token_chunks([[42] + line], chunk_size=1002, overlap=64)
+
+    assert len(original_chunks) >= 3
+    assert all(len(chunk) <= 1002 for chunk in edited_chunks)
+    changed_chunks = [chunk for chunk in edited_chunks if chunk not in original_chunks]
+    assert len(changed_chunks) <= 2
+    assert edited_chunks[-(len(original_chunks) - 2):] == original_chunks[2:]
+
+def test_split_token_chunks_windows_fill_most_of_budget():
+    segments = [[zlib.crc32(f"{i}-{j}".encode()) % 50000 for j in range(12 + i % 14)] for i in range(160)]
+    total_tokens = sum(len(segment) for segment in segments)
+    chunks = _split_token_chunks(segments, chunk_size=1002, overlap=64)
+
+    # Sem chunks minúsculos: todos, exceto o último, têm ao menos 2/3 do orçamento
+    assert all(len(chunk) >= (1002 - 64) * 2 // 3 for chunk in chunks[:-1])
+    assert len(chunks) <= total_tokens // ((1002 - 64) * 2 // 3) + 1
+
+@patch('app.services.llm_service.summarizer')
+def test_generate_summary_long_text_recomputes_only_edited_chunk(mock_summarizer):
+    llm_service._chunk_summary_cache.clear()
+    mock_tokenizer = mock_summarizer.tokenizer
+    mock_tokenizer.model_max_length = 200
+    mock_tokenizer.num_special_tokens_to_add.return_value = 2
+    mock_tokenizer.side_effect = _fake_line_tokenizer
+    mock_tokenizer.build_inputs_with_special_tokens.side_effect = lambda ids: [0] + ids + [2]
+    mock_tokenizer.pad.side_effect = lambda batch, return_tensors: {
+        "input_ids": batch["input_ids"], "attention_mask": MagicMock()
+    }
+    mock_summarizer.model.generate.side_effect = lambda input_ids, **kwargs: input_ids
+    mock_tokenizer.batch_decode.side_effect = lambda ids, skip_special_tokens: [f"sumário {sum(i) % 997}" for i in ids]
+
+    def generated_inputs():
+        return sum(len(call.args[0]) for call in mock_summarizer.model.generate.call_args_list)
+
+    cv_lines = [f"secao{i // 8} linha{i} experiencia python fastapi mongodb docker aws" for i in range(80)]
+    summary = generate_summary("\n".join(cv_lines))
+    assert summary.startswith("sumário")
+    # Todos os chunks (map) mais os sumários concatenados (reduce), em lotes
+    first_run_inputs = generated_inputs()
+    assert first_run_inputs >= 5
+    assert all(len(call.args[0]) <= llm_service.SUMMARY_CHUNK_BATCH_SIZE for call in mock_summarizer.model.generate.call_args_list)
+
+    # Reenviar o mesmo texto não gera nada novo
+    generate_summary("\n".join(cv_lines))
+    assert generated_inputs() == first_run_inputs
+
+    # Editar uma linha no início recalcula só os chunks vizinhos da edição (o editado, um corte
+    # por tamanho deslocado e o que herda a sobreposição) e o reduce; os demais vêm do cache
+    edited_lines = list(cv_lines)
+    edited_lines[3] = edited_lines[3] + " kubernetes terraform"
+    mock_summarizer.model.generate.reset_mock()
+    generate_summary("\n".join(edited_lines))
+    assert generated_inputs() <= 4
+    assert generated_inputs() < first_run_inputs // 3